@@ -1,17 +1,28 @@
 import os
+import logging
 import json
 import hashlib
+import functools
 import time
+import threading
+import orjson
 import requests
-import feedparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import gspread
+from gspread.utils import a1_to_rowcol
 from google.oauth2.service_account import Credentials
 from dateutil import parser as dateparser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
 from zoneinfo import ZoneInfo
+from xml.etree import ElementTree
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
 
+logger = logging.getLogger("monitor")
+
 # ============================================================
 # CONFIG
 # ============================================================
@@ -26,42 +37,87 @@ BASE_KEYWORDS = ["Hashed", "해시드"]
 
 # Slack 폭주 방지
 MAX_SLACK_ALERTS = 10
+# 개별 알림 동시 전송 수 (Slack rate limit 고려해 작게 유지)
+SLACK_MAX_CONCURRENCY = 4
+# chat.postMessage 토큰 버킷: 초당 1개씩 채우고 최대 SLACK_BURST개까지 모아 둠
+# (Slack은 채널당 초당 1건 + 짧은 burst 허용 → 장기적으로 초당 1건을 넘지 않음)
+SLACK_POSTS_PER_SEC = 1
+SLACK_BURST = 3
+# 기본은 새 기사 여러 건을 메시지 1개로 묶어 전송. 1/true면 기사마다 개별 메시지
+SLACK_INDIVIDUAL_ALERTS = os.getenv("SLACK_INDIVIDUAL_ALERTS", "").strip().lower() in ("1", "true", "yes")
+
+# sheet1 1행 header (fetched_at 열은 meta since 행의 C열로 이동)
+SHEET_HEADER = ["id", "published_at", "source", "title", "url"]
+# 위 레이아웃으로 이전 완료 표시 (meta "sheet_layout" 값). 있으면 header를 다시 읽지 않음
+SHEET_LAYOUT = "5col"
 
 # 시트에서 이미 본 ID 읽어오는 최대 개수 (너무 커질 경우 대비)
 SHEET_ID_LOAD_LIMIT = 8000
 
+# meta 탭에서 읽는 범위 (A:B 열 전체를 한 번의 요청으로. 행 수 제한을 두면 아래쪽 key를 못 찾음)
+META_RANGE = "A:B"
+# since는 고정 주소: A2="since", B2=ISO 시각, C2=마지막으로 행을 추가한 실행의 fetched_at
+# (예전 시트처럼 since가 다른 행에 있으면 그 행의 B/C열)
+META_SINCE_ROW = 2
+
 # 오래된 기사 방지 안전장치 (보험)
 MAX_LOOKBACK_DAYS = 7
 
+# 최근 본 id 로컬 캐시 (시트 읽기 전에 먼저 확인)
+# 시트마다 id 집합이 다르므로 파일명에 GOOGLE_SHEET_ID 포함
+SEEN_IDS_CACHE_DIR = os.getenv("SEEN_IDS_CACHE_DIR", "/tmp").strip()
+SEEN_IDS_CACHE_PATH = os.path.join(SEEN_IDS_CACHE_DIR, f"hashed_monitor_ids_{GOOGLE_SHEET_ID}.json")
+SEEN_IDS_CACHE_LIMIT = 50000
+
+# ============================================================
+# HTTP
+# ============================================================
+# Slack/GDELT/Google News 호출이 TCP+TLS 연결을 재사용하도록 세션 하나를 공유.
+# 429/5xx 재시도는 어댑터가 처리 (POST는 재시도하지 않음 → Slack 중복 전송 방지)
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "HashedMonitorBot/1.0"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    ),
+))
+
 # ============================================================
 # UTILS
 # ============================================================
+# 제거할 트래킹 파라미터 (매 호출마다 tuple을 새로 만들지 않도록 모듈 상수로)
+_TRACK_EXACT = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid"})
+_TRACK_PREFIXES = ("utm_",)
+
+
+@functools.lru_cache(maxsize=2048)
 def normalize_url(url: str) -> str:
-    """URL에서 트래킹 파라미터 등을 제거해 id 안정성 개선."""
+    """URL에서 트래킹 파라미터 등을 제거해 id 안정성 개선. (str → str 순수 함수라 캐시 안전)"""
     if not url:
         return url
     url = url.strip()
     p = urlparse(url)
 
-    # fragment 제거
-    p = p._replace(fragment="")
+    # fragment 제거 + 호스트 소문자
+    p = p._replace(fragment="", netloc=p.netloc.lower())
+
+    # query가 없으면 parse_qsl/urlencode 왕복 생략
+    if not p.query:
+        return urlunparse(p)
 
     # query에서 트래킹 제거
     q = parse_qsl(p.query, keep_blank_values=True)
-    filtered = []
-    for k, v in q:
-        lk = k.lower()
-        if lk.startswith("utm_"):
-            continue
-        if lk in ("fbclid", "gclid", "mc_cid", "mc_eid"):
-            continue
-        filtered.append((k, v))
-    new_query = urlencode(filtered, doseq=True)
-    p = p._replace(query=new_query)
-
-    # 호스트 소문자
-    p = p._replace(netloc=p.netloc.lower())
-    return urlunparse(p)
+    filtered = [
+        (k, v) for k, v in q
+        if not ((lk := k.lower()).startswith(_TRACK_PREFIXES) or lk in _TRACK_EXACT)
+    ]
+    return urlunparse(p._replace(query=urlencode(filtered, doseq=True)))
 
 
 def today_midnight_kst_utc() -> datetime:
@@ -72,13 +128,28 @@ def today_midnight_kst_utc() -> datetime:
     return midnight_kst.astimezone(timezone.utc)
 
 
-def make_id(source: str, url: str) -> str:
-    """기사 중복 판정용 ID."""
-    url = normalize_url(url)
+@functools.lru_cache(maxsize=4096)
+def make_id(source: str, url: str) -> bytes:
+    """
+    기사 중복 판정용 ID (보안 용도가 아니므로 sha256 대신 더 빠르고 짧은 blake2b-128).
+    url은 이미 normalize_url을 거친 값이어야 함 (run()에서 기사당 한 번 정규화).
+    메모리/set 조회용으로 raw 16바이트를 쓰고, 시트에 쓸 때만 .hex()로 변환.
+    """
     raw = f"{source}|{url}".encode("utf-8")
-    return hashlib.sha256(raw).hexdigest()
+    return hashlib.blake2b(raw, digest_size=16).digest()
 
 
+def feed_content_hash(mentions: list) -> str:
+    """
+    수집 결과 전체의 내용 해시 (순서 무관).
+    RSS 원본 바이트는 lastBuildDate가 매번 바뀌므로 파싱된 (source, url, published_at_dt)로 계산.
+    """
+    keys = sorted(f"{m['source']}|{m['url']}|{m['published_at_dt']}" for m in mentions)
+    return hashlib.blake2b("\n".join(keys).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# 같은 피드 안에서 같은 발행 시각 문자열이 반복되므로 결과 캐시 (datetime은 불변이라 공유 안전)
+@functools.lru_cache(maxsize=512)
 def safe_parse_dt(value: str):
     """
     published_at 파싱.
@@ -89,7 +160,10 @@ def safe_parse_dt(value: str):
     if not value:
         return None
     try:
-        dt = dateparser.parse(value)
+        # 실제로 들어오는 두 형식은 전용 파서로 먼저 처리 (dateutil은 느린 범용 파서)
+        dt = _parse_iso_or_rfc2822(value)
+        if dt is None:
+            dt = dateparser.parse(value)
         if not dt:
             return None
         if not dt.tzinfo:
@@ -100,10 +174,36 @@ def safe_parse_dt(value: str):
         return None
 
 
+@functools.lru_cache(maxsize=512)
+def parse_rss_dt(value: str):
+    """RSS pubDate(RFC-822) 전용: 형식이 고정이라 바로 parsedate_to_datetime, 실패 시에만 safe_parse_dt."""
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return safe_parse_dt(value)
+    if not dt.tzinfo:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _parse_iso_or_rfc2822(value: str):
+    """ISO-8601(우리가 만든 값) / RFC-2822(Google News RSS) 시도, 둘 다 아니면 None."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
 # ============================================================
 # SLACK
 # ============================================================
+@functools.lru_cache(maxsize=1)
 def slack_headers():
+    """토큰 검증 + 헤더 생성은 한 번만 (재시도/다건 전송 시 같은 dict 재사용, 수정 금지)."""
     if not SLACK_BOT_TOKEN.startswith("xoxb-"):
         raise RuntimeError("SLACK_BOT_TOKEN is missing or invalid. (should start with xoxb-...)")
     return {
@@ -112,51 +212,124 @@ def slack_headers():
     }
 
 
+# 전송마다 토큰 하나를 소비, 토큰은 초당 SLACK_POSTS_PER_SEC개씩 보충 → 병렬 전송이어도 초당 1건 유지
+_SLACK_BUCKET_LOCK = threading.Lock()
+_slack_bucket = {"tokens": float(SLACK_BURST), "at": time.monotonic()}
+
+
+def slack_throttle():
+    while True:
+        with _SLACK_BUCKET_LOCK:
+            now = time.monotonic()
+            tokens = min(SLACK_BURST, _slack_bucket["tokens"] + (now - _slack_bucket["at"]) * SLACK_POSTS_PER_SEC)
+            _slack_bucket["at"] = now
+            if tokens >= 1:
+                _slack_bucket["tokens"] = tokens - 1
+                return
+            _slack_bucket["tokens"] = tokens
+            wait = (1 - tokens) / SLACK_POSTS_PER_SEC
+        time.sleep(wait)
+
+
 def slack_post_with_retry(payload, retries=3):
     """Slack rate limit 대비 재시도."""
     for attempt in range(1, retries + 1):
-        r = requests.post(
+        slack_throttle()
+        r = _SESSION.post(
             "https://slack.com/api/chat.postMessage",
             headers=slack_headers(),
             json=payload,
             timeout=15
         )
-        data = r.json()
+        # 상태 코드를 본문보다 먼저 확인 (429/5xx는 본문이 비었거나 HTML일 수 있음)
+        if r.status_code == 429:
+            slack_sleep_retry_after(r, attempt)
+            continue
+        if r.status_code >= 500:
+            logger.warning("[Slack] attempt %d/%d failed: HTTP %d", attempt, retries, r.status_code)
+            time.sleep(2 * attempt)
+            continue
+
+        try:
+            data = orjson.loads(r.content)
+        except ValueError:
+            logger.error("[Slack] post failed: HTTP %d, non-JSON response", r.status_code)
+            return False
         if data.get("ok"):
             return True
 
         err = data.get("error")
-        if err == "rate_limited":
-            time.sleep(2 * attempt)
+        if err in ("rate_limited", "ratelimited"):
+            slack_sleep_retry_after(r, attempt)
             continue
 
-        print("[Slack] post failed:", err)
+        logger.error("[Slack] post failed: %s", err)
         return False
     return False
 
 
-def slack_post_mention(channel_id: str, mention: dict):
-    title = mention["title"]
-    url = mention["url"]
-    source = mention["source"]
-    published = mention["published_at"]
+def slack_sleep_retry_after(r, attempt):
+    """Slack이 알려주는 대기 시간(Retry-After, 초)을 우선 사용, 없으면 선형 backoff."""
+    retry_after = r.headers.get("Retry-After")
+    time.sleep(int(retry_after) if retry_after and retry_after.isdigit() else 2 * attempt)
+
+
+SLACK_CONTEXT_BLOCK = {"type": "context", "elements": [{"type": "mrkdwn", "text": "자동 모니터링 봇 (Google News RSS + GDELT)"}]}
+
 
+def slack_mention_section(mention: dict):
+    return {"type": "section",
+            "text": {"type": "mrkdwn",
+                     "text": f"*<{mention['url']}|{mention['title']}>*\n\n*Source:* `{mention['source']}`\n*Published:* `{mention['published_at']}`"}}
+
+
+def slack_post_mention(channel_id: str, mention: dict):
     blocks = [
         {"type": "header", "text": {"type": "plain_text", "text": "🟣 Hashed Mentions Alert", "emoji": True}},
         {"type": "divider"},
-        {"type": "section",
-         "text": {"type": "mrkdwn",
-                  "text": f"*<{url}|{title}>*\n\n*Source:* `{source}`\n*Published:* `{published}`"}},
+        slack_mention_section(mention),
+        {"type": "divider"},
+        SLACK_CONTEXT_BLOCK
+    ]
+
+    payload = {"channel": channel_id, "text": f"[{mention['source']}] {mention['title']}", "blocks": blocks}
+    ok = slack_post_with_retry(payload)
+    if not ok:
+        raise RuntimeError("Slack chat.postMessage failed after retries.")
+
+
+def slack_post_batch(channel_id: str, mentions: list):
+    """여러 건을 기사별 section block으로 메시지 1개에 묶어 전송 (N번 대신 요청 1번)."""
+    blocks = [
+        {"type": "header", "text": {"type": "plain_text", "text": f"🟣 Hashed Mentions Alert ({len(mentions)})", "emoji": True}},
         {"type": "divider"},
-        {"type": "context", "elements": [{"type": "mrkdwn", "text": "자동 모니터링 봇 (Google News RSS + GDELT)"}]}
     ]
+    for m in mentions:
+        blocks += [slack_mention_section(m), {"type": "divider"}]
+    blocks.append(SLACK_CONTEXT_BLOCK)
 
-    payload = {"channel": channel_id, "text": f"[{source}] {title}", "blocks": blocks}
+    payload = {"channel": channel_id, "text": f"🟣 Hashed Mentions: {len(mentions)} new", "blocks": blocks}
     ok = slack_post_with_retry(payload)
     if not ok:
         raise RuntimeError("Slack chat.postMessage failed after retries.")
 
 
+def slack_post_mentions(channel_id: str, mentions: list):
+    """
+    기본은 메시지 1개로 묶어 전송.
+    SLACK_INDIVIDUAL_ALERTS면 개별 알림을 SLACK_MAX_CONCURRENCY개씩 동시에 전송.
+    """
+    if len(mentions) == 1:
+        slack_post_mention(channel_id, mentions[0])
+        return
+    if not SLACK_INDIVIDUAL_ALERTS:
+        slack_post_batch(channel_id, mentions)
+        return
+    with ThreadPoolExecutor(max_workers=SLACK_MAX_CONCURRENCY) as ex:
+        # list()로 소비해야 실패 시 예외가 그대로 올라옴
+        list(ex.map(lambda m: slack_post_mention(channel_id, m), mentions))
+
+
 def slack_post_digest(channel_id: str, mentions: list):
     """Slack 폭주 방지: 남은 항목은 digest 1번으로 요약."""
     if not mentions:
@@ -186,7 +359,7 @@ def get_gspread_client():
         raise RuntimeError("GOOGLE_SERVICE_ACCOUNT_JSON is missing.")
     if not GOOGLE_SHEET_ID:
         raise RuntimeError("GOOGLE_SHEET_ID is missing.")
-    info = json.loads(GOOGLE_SERVICE_ACCOUNT_JSON)
+    info = orjson.loads(GOOGLE_SERVICE_ACCOUNT_JSON)
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive"
@@ -204,59 +377,185 @@ def get_worksheets():
     try:
         meta_ws = sh.worksheet("meta")
     except Exception:
-        raise RuntimeError("Worksheet 'meta' not found. Please create a sheet tab named 'meta' with key/value rows.")
+        raise RuntimeError("Worksheet 'meta' not found. Please create a sheet tab named 'meta' with key/value rows (A2=since).")
     return ws, meta_ws
 
 
-def sheet_get_existing_ids(ws, limit=SHEET_ID_LOAD_LIMIT):
-    """A열(id)을 읽어서 이미 본 기사 set 구성."""
-    col = ws.col_values(1)
-    if not col:
-        return set()
-    ids = col[1:]  # header 제외
-    if len(ids) > limit:
-        ids = ids[-limit:]
-    return set(ids)
+def sheet_get_existing_ids(ws, last_row=None, limit=SHEET_ID_LOAD_LIMIT):
+    """
+    A열(id, hex)의 마지막 limit개 데이터 행만 읽어서 이미 본 기사 set(raw bytes) 구성.
+    last_row: 지난 append 응답에서 얻어 meta "sheet_last_row"에 저장해 둔 마지막 데이터 행.
+      ws.row_count는 빈 행까지 포함한 grid 크기라서 창 기준으로 쓰지 않음.
+      모르면(업그레이드 직후 첫 실행 등) A2:A를 읽고 뒤에서 limit개만 사용 (API가 끝의 빈 행은 잘라서 반환).
+    """
+    if last_row:
+        start = max(2, last_row - limit + 1)  # 2행부터 읽으므로 header 제외
+        values = ws.get(f"A{start}:A{last_row}", value_render_option="UNFORMATTED_VALUE")
+    else:
+        values = ws.get("A2:A", value_render_option="UNFORMATTED_VALUE")[-limit:]
+    ids = set()
+    for row in values:
+        if not row:
+            continue
+        try:
+            ids.add(bytes.fromhex(str(row[0])))
+        except ValueError:
+            # hex가 아닌 값(수동 입력 등)은 어차피 매칭될 일이 없으므로 무시
+            continue
+    return ids
 
 
 def sheet_append_rows(ws, rows):
-    """rows: [id, fetched_at, published_at, source, title, url]"""
+    """
+    rows: [id, published_at, source, title, url] (fetched_at은 행마다 반복하지 않고 meta since 행의 C열에 저장)
+    반환: 추가된 마지막 행 번호 (응답의 updatedRange 기준, 행이 없으면 None)
+    """
     if not rows:
+        return None
+    # table_range=A1 고정 → 서버가 마지막 행을 다시 찾지 않음
+    resp = ws.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS", table_range="A1")
+    last_cell = resp["updates"]["updatedRange"].split("!")[-1].split(":")[-1]
+    return a1_to_rowcol(last_cell)[0]
+
+
+def sheet_migrate_header(ws, meta_ws, meta):
+    """
+    예전 6열 레이아웃(fetched_at 열 포함)이면 그 열을 삭제해 SHEET_HEADER로 맞춤.
+    확인 결과를 meta "sheet_layout"에 남겨 이후 실행에서는 header를 다시 읽지 않음.
+    """
+    if meta_get(meta, "sheet_layout") == SHEET_LAYOUT:
         return
-    ws.append_rows(rows, value_input_option="RAW")
+    header = ws.row_values(1)
+    if "fetched_at" in header:
+        ws.delete_columns(header.index("fetched_at") + 1)
+        logger.info("[sheet] removed legacy 'fetched_at' column from sheet1 header %s", header)
+    meta_set(meta_ws, meta, "sheet_layout", SHEET_LAYOUT)
+
+
+def meta_read(meta_ws) -> dict:
+    """meta 탭(key/value)을 한 번의 요청으로 읽어 {key: [row, value]} 반환 (쓰기 때 행 번호 재사용)."""
+    meta = {}
+    for i, row in enumerate(meta_ws.get(META_RANGE)[1:], start=2):
+        if row and row[0] and row[0] not in meta:
+            meta[row[0]] = [i, row[1].strip() if len(row) >= 2 and row[1] else None]
+    return meta
+
+
+def meta_get(meta, key):
+    return meta.get(key, [None, None])[1]
 
 
-def meta_get_since(meta_ws):
-    values = meta_ws.get_all_values()
-    for row in values[1:]:
-        if len(row) >= 2 and row[0] == "since":
-            return row[1].strip() if row[1] else None
-    return None
+def meta_set(meta_ws, meta, key, value):
+    meta_set_many(meta_ws, meta, {key: value})
 
 
-def meta_set_since(meta_ws, iso_time):
-    values = meta_ws.get_all_values()
-    for i, row in enumerate(values[1:], start=2):
-        if len(row) >= 1 and row[0] == "since":
-            meta_ws.update_cell(i, 2, iso_time)
-            return
-    meta_ws.append_row(["since", iso_time], value_input_option="RAW")
+def meta_set_many(meta_ws, meta, items: dict, extra_cells=None):
+    """
+    읽을 때 찾아둔 행들에 batch_update 한 번으로 쓰기. 처음 보는 key는 append 후 행 번호 기록.
+    extra_cells: {A1 주소: 값} — key/value 외 셀도 같은 요청으로 함께 쓰기.
+    """
+    known = [{"range": f"B{meta[k][0]}", "values": [[v]]} for k, v in items.items() if k in meta]
+    known += [{"range": a1, "values": [[v]]} for a1, v in (extra_cells or {}).items()]
+    if known:
+        meta_ws.batch_update(known, value_input_option="RAW")
+    for key, value in items.items():
+        if key in meta:
+            meta[key][1] = value
+            continue
+        resp = meta_ws.append_row([key, value], value_input_option="RAW")
+        first_cell = resp["updates"]["updatedRange"].split("!")[-1].split(":")[0]
+        meta[key] = [a1_to_rowcol(first_cell)[0], value]
+
+
+def meta_get_since(meta):
+    return meta_get(meta, "since")
+
+
+def meta_set_since(meta_ws, meta, iso_time):
+    """첫 실행이고 2행이 비어 있으면 append 대신 A2:B2 고정 주소에 바로 쓰기."""
+    if "since" not in meta and all(row != META_SINCE_ROW for row, _ in meta.values()):
+        rng = f"A{META_SINCE_ROW}:B{META_SINCE_ROW}"
+        meta_ws.update(range_name=rng, values=[["since", iso_time]], value_input_option="RAW")
+        meta["since"] = [META_SINCE_ROW, iso_time]
+        return
+    meta_set(meta_ws, meta, "since", iso_time)
+
+
+# ============================================================
+# LOCAL CACHE
+# ============================================================
+def local_ids_load(path=SEEN_IDS_CACHE_PATH) -> dict:
+    """로컬 캐시(hex 목록)에서 최근 본 id 로드. dict를 삽입 순서 유지 set으로 사용 (없거나 깨졌으면 빈 캐시)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return dict.fromkeys(bytes.fromhex(x) for x in json.load(f))
+    except (OSError, ValueError):
+        return {}
+
+
+def local_ids_save(local_ids: dict, path=SEEN_IDS_CACHE_PATH, limit=SEEN_IDS_CACHE_LIMIT):
+    """최근 limit개만 남겨 저장 (오래된 id부터 버림)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump([i.hex() for i in list(local_ids)[-limit:]], f)
+    os.replace(tmp, path)
 
 
 # ============================================================
 # SOURCES
 # ============================================================
-def fetch_google_news_rss(query: str):
+def fetch_google_news_rss(query: str, validators=None):
+    """
+    _SESSION으로 받아서 필요한 3개 필드(title/link/pubDate)만 ElementTree로 추출.
+    validators: 지난 응답의 {"gnews_etag", "gnews_last_modified", "gnews_body_hash"}
+      → 조건부 GET(304)이나 본문 해시가 같으면 파싱 생략.
+    반환: (results, 다음 실행에 쓸 validators). 실패해도 []와 기존 validators 반환(전체 봇은 계속 동작).
+    """
+    validators = validators or {}
     url = f"https://news.google.com/rss/search?q={requests.utils.quote(query)}&hl=ko&gl=KR&ceid=KR:ko"
-    feed = feedparser.parse(url)
+    headers = {}
+    if validators.get("gnews_etag"):
+        headers["If-None-Match"] = validators["gnews_etag"]
+    if validators.get("gnews_last_modified"):
+        headers["If-Modified-Since"] = validators["gnews_last_modified"]
+    try:
+        r = _SESSION.get(url, headers=headers, timeout=15)
+        if r.status_code == 304:
+            # 지난 실행 이후 피드 변화 없음 → 새 기사도 없음
+            return [], validators
+        r.raise_for_status()
+    except Exception as e:
+        logger.warning("[GoogleNewsRSS] fetch failed: %s", e)
+        return [], validators
+
+    # ETag를 무시하는 경우 대비: item 부분 해시가 지난번과 같으면 파싱 생략
+    # (<item> 앞의 lastBuildDate는 매번 바뀌므로 해시에서 제외)
+    body = r.content
+    body_hash = hashlib.blake2b(body[max(body.find(b"<item"), 0):], digest_size=16).hexdigest()
+    new_validators = {
+        "gnews_etag": r.headers.get("ETag"),
+        "gnews_last_modified": r.headers.get("Last-Modified"),
+        "gnews_body_hash": body_hash,  # 파싱 성공(또는 지난번과 동일) 시에만 저장
+    }
+    new_validators = {k: v for k, v in new_validators.items() if v}
+    if body_hash == validators.get("gnews_body_hash"):
+        # 본문은 그대로여도 새 ETag/Last-Modified는 저장해야 다음 실행에서 304를 받을 수 있음
+        return [], new_validators
+
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError as e:
+        logger.warning("[GoogleNewsRSS] parse failed: %s", e)
+        return [], validators
 
     results = []
-    for entry in feed.entries:
-        title = entry.title
-        link = entry.link
-        published = entry.get("published")
+    for item in root.iterfind("./channel/item"):
+        title = item.findtext("title", "")
+        link = item.findtext("link", "")
+        published = item.findtext("pubDate")
 
-        published_dt = safe_parse_dt(published) if published else None
+        published_dt = parse_rss_dt(published) if published else None
         if not published_dt:
             # ✅ published_at이 없으면 이 소스에서는 스킵하는게 안전
             # (오래된 기사/깨진 기사들이 now로 간주되는 문제 방지)
@@ -266,14 +565,31 @@ def fetch_google_news_rss(query: str):
             "source": "GoogleNewsRSS",
             "title": title,
             "url": link,
-            "published_at": published_dt.isoformat(),
+            "published_at_dt": published_dt,
         })
-    return results
+    return results, new_validators
+
+
+def _parse_seendate(s: str):
+    """
+    GDELT seendate(yyyymmddHHMMSS, 실제 응답은 yyyymmddTHHMMSSZ 형태도 옴) → UTC datetime.
+    고정 폭이라 strptime 대신 슬라이싱. 실패하면 None.
+    """
+    try:
+        s = s.replace("T", "").rstrip("Z")
+        if len(s) != 14:
+            return None
+        return datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]),
+                        int(s[8:10]), int(s[10:12]), int(s[12:14]), tzinfo=timezone.utc)
+    except (TypeError, AttributeError, ValueError):
+        # 이상한 값 하나 때문에 응답 전체를 다시 받지 않도록 이 기사만 스킵
+        return None
 
 
 def fetch_gdelt(query: str, max_records=50, retries=3):
     """
     GDELT는 HTML 오류를 주기도 하므로 방어 + 재시도.
+    (HTTP 상태/연결 오류 재시도는 _SESSION 어댑터가 담당, 여기서는 응답 본문 이상만 재시도)
     실패해도 [] 반환(전체 봇은 계속 동작).
     """
     url = "https://api.gdeltproject.org/api/v2/doc/doc"
@@ -284,43 +600,39 @@ def fetch_gdelt(query: str, max_records=50, retries=3):
         "maxrecords": max_records,
         "sort": "HybridRel"
     }
-    headers = {"User-Agent": "HashedMonitorBot/1.0"}
 
     last_err = None
     for attempt in range(1, retries + 1):
         try:
-            r = requests.get(url, params=params, headers=headers, timeout=20)
+            r = _SESSION.get(url, params=params, timeout=20)
 
             if r.status_code != 200:
+                # 어댑터가 이미 재시도한 결과이므로 여기서 다시 돌지 않음
                 last_err = f"GDELT HTTP {r.status_code}"
-                print(f"[GDELT] attempt {attempt}/{retries} failed: {last_err}")
-                continue
+                logger.warning("[GDELT] attempt %d/%d failed: %s", attempt, retries, last_err)
+                break
 
-            if not r.text or len(r.text.strip()) == 0:
+            # r.text는 본문 전체를 str로 디코딩하므로 bytes로만 확인
+            if not r.content.strip():
                 last_err = "GDELT empty response"
-                print(f"[GDELT] attempt {attempt}/{retries} failed: {last_err}")
+                logger.warning("[GDELT] attempt %d/%d failed: %s", attempt, retries, last_err)
                 continue
 
             ctype = r.headers.get("Content-Type", "")
             if "application/json" not in ctype:
                 last_err = f"GDELT non-json content-type: {ctype}"
-                print(f"[GDELT] attempt {attempt}/{retries} failed: {last_err}")
-                print("[GDELT] response head:", r.text[:200])
+                logger.warning("[GDELT] attempt %d/%d failed: %s", attempt, retries, last_err)
+                logger.warning("[GDELT] response head: %s", r.content[:200].decode("utf-8", "replace"))
                 continue
 
-            data = r.json()
+            data = orjson.loads(r.content)
             results = []
             for item in data.get("articles", []):
                 title = item.get("title", "")
                 link = item.get("url", "")
                 seendate = item.get("seendate")  # yyyymmddHHMMSS
 
-                published_dt = None
-                if seendate:
-                    try:
-                        published_dt = datetime.strptime(seendate, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
-                    except Exception:
-                        published_dt = None
+                published_dt = _parse_seendate(seendate) if seendate else None
 
                 # ✅ 파싱 실패하면 스킵 (now 대체 절대 금지)
                 if not published_dt:
@@ -330,15 +642,21 @@ def fetch_gdelt(query: str, max_records=50, retries=3):
                     "source": "GDELT",
                     "title": title,
                     "url": link,
-                    "published_at": published_dt.isoformat(),
+                    "published_at_dt": published_dt,
                 })
             return results
 
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # 연결/타임아웃도 어댑터에서 재시도 완료된 상태
+            last_err = str(e)
+            logger.warning("[GDELT] attempt %d/%d exception: %s", attempt, retries, last_err)
+            break
+
         except Exception as e:
             last_err = str(e)
-            print(f"[GDELT] attempt {attempt}/{retries} exception: {last_err}")
+            logger.warning("[GDELT] attempt %d/%d exception: %s", attempt, retries, last_err)
 
-    print(f"[GDELT] giving up after {retries} attempts. last_err={last_err}")
+    logger.error("[GDELT] giving up. last_err=%s", last_err)
     return []
 
 
@@ -360,19 +678,20 @@ def run():
     ws, meta_ws = get_worksheets()
 
     # 2) since 읽기
-    since_str = meta_get_since(meta_ws)
+    meta = meta_read(meta_ws)
+    since_str = meta_get_since(meta)
 
     if not since_str:
         # ✅ 첫 실행: '지금부터 시작'
-        meta_set_since(meta_ws, now_utc.isoformat())
-        print("First run: since initialized to now. No notifications this run.")
+        meta_set_since(meta_ws, meta, now_utc.isoformat())
+        logger.info("First run: since initialized to now. No notifications this run.")
         return
 
     since_dt = safe_parse_dt(since_str)
     if not since_dt:
         # meta since가 깨진 경우에도 안전하게 now로 리셋
-        meta_set_since(meta_ws, now_utc.isoformat())
-        print("since value invalid → reset to now, skipping this run.")
+        meta_set_since(meta_ws, meta, now_utc.isoformat())
+        logger.warning("since value invalid → reset to now, skipping this run.")
         return
 
     # ✅ 오늘 0:00(KST) 이전은 무조건 방지
@@ -383,19 +702,33 @@ def run():
     google_query = '("Hashed" OR "해시드")'
     gdelt_query = '("Hashed" OR "해시드")'
 
-    # 4) Fetch
-    all_results = []
-    all_results += fetch_google_news_rss(google_query)
-    all_results += fetch_gdelt(gdelt_query)
+    # 4) Fetch (두 소스는 서로 독립적이므로 동시에 요청)
+    rss_validators = {k: meta_get(meta, k) for k in ("gnews_etag", "gnews_last_modified", "gnews_body_hash")}
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_rss = ex.submit(fetch_google_news_rss, google_query, rss_validators)
+        f_gdelt = ex.submit(fetch_gdelt, gdelt_query)
+        rss_results, new_rss_validators = f_rss.result()
+        all_results = rss_results + f_gdelt.result()
+    # 바뀐 ETag/Last-Modified/본문 해시만 since와 같은 요청으로 meta에 저장
+    meta_updates = {k: v for k, v in new_rss_validators.items() if v != rss_validators.get(k)}
+
+    # 지난 실행과 수집 결과가 같으면 시트 id 읽기/저장/Slack 모두 생략하고 since만 갱신
+    feed_hash = feed_content_hash(all_results)
+    if feed_hash == meta_get(meta, "feed_hash"):
+        meta_set_many(meta_ws, meta, {"since": now_utc.isoformat(), **meta_updates})
+        logger.info("No feed change. [meta] since updated to %s", now_utc.isoformat())
+        return
 
-    # 5) 날짜 필터 (여기가 이번 문제의 핵심)
+    # 5) 날짜 필터 (여기가 이번 문제의 핵심) + 통과한 기사만 URL 정규화/id 계산 (기사당 1회)
     filtered = []
+    has_future = False
     for m in all_results:
-        pub_dt = safe_parse_dt(m.get("published_at"))
+        # fetcher가 경계에서 한 번 UTC datetime으로 변환해 둔 값을 그대로 비교에 사용
+        pub_dt = m.get("published_at_dt")
 
         # ✅ 파싱 실패한 건 절대 now로 처리하지 말고 스킵
         if not pub_dt:
-            print("[WARN] published_at parse failed → skip:", m.get("source"), m.get("title"))
+            logger.warning("published_at parse failed → skip: %s %s", m.get("source"), m.get("title"))
             continue
 
         # ✅ 이상하게 오래된 기사/미래 기사 보험
@@ -403,51 +736,76 @@ def run():
             # 예: 2023년 기사 같은 것들 강제 차단
             continue
         if pub_dt > future_cutoff:
+            # 나중 실행에서 기간 안으로 들어올 수 있으므로 이번 결과를 "처리 완료"로 기록하면 안 됨
+            has_future = True
+            if m["source"] == "GoogleNewsRSS":
+                # 304/본문 해시 생략이 걸리면 다음 실행에서 이 기사를 다시 못 보므로 RSS validator도 비움
+                meta_updates.update({k: "" for k in rss_validators if rss_validators[k] or new_rss_validators.get(k)})
             continue
 
         # ✅ “오늘 0:00 이후” + “since 이후”만
         if pub_dt >= midnight_utc and pub_dt >= since_dt:
+            m["url"] = normalize_url(m["url"])
+            m["id"] = make_id(m["source"], m["url"])
             filtered.append(m)
 
-    # 6) 시트 기반 중복 제거
-    existing_ids = sheet_get_existing_ids(ws)
+    # 6) 중복 제거: 로컬 캐시 먼저, 캐시에 없는 후보가 있을 때만 시트 읽기
+    local_ids = local_ids_load()
+    loaded_count = len(local_ids)
+    candidates = [m for m in filtered if m["id"] not in local_ids]
+    if candidates:
+        last_row = meta_get(meta, "sheet_last_row")
+        local_ids.update(dict.fromkeys(sheet_get_existing_ids(ws, int(last_row) if last_row and last_row.isdigit() else None)))
+
     new_mentions = []
-    for m in filtered:
-        m["url"] = normalize_url(m["url"])
-        m_id = make_id(m["source"], m["url"])
-        if m_id not in existing_ids:
-            m["id"] = m_id
-            m["fetched_at"] = fetched_at
+    for m in candidates:
+        if m["id"] not in local_ids:
+            # 문자열 변환은 시트/Slack에 내보낼 때 기사당 한 번만
+            m["published_at"] = m["published_at_dt"].isoformat()
             new_mentions.append(m)
 
     if new_mentions:
-        print(f"✅ New mentions: {len(new_mentions)}")
+        logger.info("✅ New mentions: %d", len(new_mentions))
 
         # ✅ 시트 저장 먼저
-        rows = []
-        for m in new_mentions:
-            rows.append([m["id"], m["fetched_at"], m["published_at"], m["source"], m["title"], m["url"]])
-        sheet_append_rows(ws, rows)
+        rows = [[m["id"].hex(), m["published_at"], m["source"], m["title"], m["url"]] for m in new_mentions]
+        sheet_migrate_header(ws, meta_ws, meta)
+        meta_updates["sheet_last_row"] = str(sheet_append_rows(ws, rows))
+        local_ids.update(dict.fromkeys(m["id"] for m in new_mentions))
+        local_ids_save(local_ids)
 
-        # ✅ Slack 전송 (상위 N개 개별 + 나머지 digest)
+        # ✅ Slack 전송 (상위 N개는 메시지 1개로 묶어서, 나머지는 digest)
         to_send = new_mentions[:MAX_SLACK_ALERTS]
         remaining = new_mentions[MAX_SLACK_ALERTS:]
 
-        for m in to_send:
-            slack_post_mention(SLACK_CHANNEL, m)
+        if to_send:
+            slack_post_mentions(SLACK_CHANNEL, to_send)
 
         if remaining:
             slack_post_digest(SLACK_CHANNEL, remaining)
 
     else:
-        print("No new mentions.")
-
-    # 7) since 갱신: 다음 실행은 이번 실행 이후 기사만
-    meta_set_since(meta_ws, now_utc.isoformat())
-    print(f"[meta] since updated to {now_utc.isoformat()}")
+        logger.info("No new mentions.")
+        if len(local_ids) != loaded_count:
+            # 시트에서 새로 알게 된 id가 있을 때만 캐시 파일 갱신 (내용이 같으면 다시 쓰지 않음)
+            local_ids_save(local_ids)
+
+    # 7) since 갱신: 다음 실행은 이번 실행 이후 기사만 (feed_hash도 같은 요청으로 저장)
+    # 미래 시각이라 보류한 기사가 있으면 feed_hash를 비워 다음 실행이 생략 없이 다시 평가
+    # C열 fetched_at은 이번 실행에서 행을 추가했을 때만 갱신 → 마지막 추가분의 수집 시각으로 남음
+    meta_set_many(
+        meta_ws, meta,
+        {"since": now_utc.isoformat(), "feed_hash": "" if has_future else feed_hash, **meta_updates},
+        extra_cells={f"C{meta['since'][0]}": fetched_at} if new_mentions else None,
+    )
+    logger.info("[meta] since updated to %s", now_utc.isoformat())
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").strip().upper(),
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
     run()
 
 